@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Ускорение внимания для генерации в 1024x1024 (Playground v2.5, Juggernaut XL, FLUX.1-dev)
+Token merging (ToMe) поверх SDPA-внимания
+
+На 1024x1024 self-attention по латентным токенам доминирует в каждом шаге.
+Похожие токены изображения сливаются двудольным сопоставлением (bipartite
+soft matching, как в ToMe-SD), но только для ключей и значений: запросы
+остаются полными, поэтому размер выхода не меняется и обратное
+разворачивание токенов не нужно.
+- UNet: сливаются входы self-attention (attn1) на уровне 64x64;
+- FLUX.1-dev: в совместном внимании сливаются ключи/значения токенов
+  изображения уже после RoPE, текстовые токены и запросы не трогаются.
+
+Внимание считается через scaled_dot_product_attention (flash /
+memory-efficient ядра); для UNet режим явно ставит SDPA-процессоры.
+"""
+
+import torch
+import torch.nn.functional as F
+from diffusers.models.attention_processor import AttnProcessor2_0
+from diffusers.models.embeddings import apply_rotary_emb
+
+try:  # diffusers 0.30: RoPE FLUX передаётся одним тензором
+    from diffusers.models.attention_processor import apply_rope
+except ImportError:
+    apply_rope = None
+
+from pipeline_hooks import add_call_hook, remove_call_hook
+
+DEFAULT_MERGE_RATIO = 0.5
+# Сливаем только на уровнях с большим числом токенов: 64x64 при 1024px
+DEFAULT_MIN_TOKENS = 4096
+
+
+def bipartite_merge(metric, height, width, ratio, stride=2, generator=None):
+    """
+    Строит слияние токенов по метрике (B, N, C) на сетке height x width.
+    В каждом окне stride x stride один токен - приёмник (dst), остальные -
+    источники; доля ratio самых похожих источников усредняется в свои
+    приёмники. Возвращает функцию merge(x) для тензоров (B, N, C') или None.
+    """
+    batch, tokens, _ = metric.shape
+    if height * width != tokens:
+        return None
+
+    hsy, wsx = height // stride, width // stride
+    num_dst = hsy * wsx
+    r = min(int(tokens * ratio), tokens - num_dst)
+    if r <= 0:
+        return None
+
+    # Случайный приёмник в каждом окне; хвост за пределами окон - источники
+    device = generator.device if generator is not None else metric.device
+    rand_idx = torch.randint(
+        stride * stride, size=(hsy, wsx, 1), device=device, generator=generator
+    ).to(metric.device)
+    idx_buffer = torch.zeros(hsy, wsx, stride * stride, device=metric.device, dtype=torch.int64)
+    idx_buffer.scatter_(2, rand_idx, -1)
+    idx_buffer = idx_buffer.view(hsy, wsx, stride, stride).transpose(1, 2).reshape(
+        hsy * stride, wsx * stride
+    )
+    if hsy * stride < height or wsx * stride < width:
+        padded = torch.zeros(height, width, device=metric.device, dtype=torch.int64)
+        padded[:hsy * stride, :wsx * stride] = idx_buffer
+        idx_buffer = padded
+    order = idx_buffer.reshape(1, -1, 1).argsort(dim=1)
+    dst_idx = order[:, :num_dst]
+    src_idx = order[:, num_dst:]
+
+    def split(t):
+        c = t.shape[-1]
+        return (
+            t.gather(1, src_idx.expand(batch, -1, c)),
+            t.gather(1, dst_idx.expand(batch, -1, c)),
+        )
+
+    a_metric, b_metric = split(metric / metric.norm(dim=-1, keepdim=True))
+    scores = a_metric @ b_metric.transpose(-1, -2)
+    node_max, node_idx = scores.max(dim=-1)
+    edge_idx = node_max.argsort(dim=-1, descending=True)[..., None]
+    unm_idx = edge_idx[:, r:]
+    merge_idx = edge_idx[:, :r]
+    target_idx = node_idx[..., None].gather(1, merge_idx)
+
+    def merge(x):
+        channels = x.shape[-1]
+        src, dst = split(x)
+        unmerged = src.gather(1, unm_idx.expand(-1, -1, channels))
+        merged = src.gather(1, merge_idx.expand(-1, -1, channels))
+        dst = dst.scatter_reduce(1, target_idx.expand(-1, -1, channels), merged, reduce="mean")
+        return torch.cat([unmerged, dst], dim=1)
+
+    return merge
+
+
+def merge_tokens(x, height, width, ratio, stride=2, generator=None):
+    """Сливает долю ratio токенов x (B, N, C), метрика - сами токены"""
+    merge = bipartite_merge(x, height, width, ratio, stride, generator)
+    return x if merge is None else merge(x)
+
+
+class TokenMergingAttnProcessor:
+    """
+    Обёртка над SDPA-процессором self-attention UNet: ключи и значения
+    считаются по слитым токенам, запросы - по всем.
+    """
+
+    def __init__(self, state, merge_ratio, min_tokens):
+        self.base = AttnProcessor2_0()
+        self.state = state
+        self.merge_ratio = merge_ratio
+        self.min_tokens = min_tokens
+
+    def __call__(self, attn, hidden_states, encoder_hidden_states=None,
+                 attention_mask=None, temb=None, *args, **kwargs):
+        if (encoder_hidden_states is None and attention_mask is None
+                and hidden_states.ndim == 3
+                and hidden_states.shape[1] >= self.min_tokens
+                and self.state.get("latent_size")):
+            latent_h, latent_w = self.state["latent_size"]
+            downsample = round((latent_h * latent_w / hidden_states.shape[1]) ** 0.5)
+            encoder_hidden_states = merge_tokens(
+                hidden_states,
+                -(-latent_h // downsample),
+                -(-latent_w // downsample),
+                self.merge_ratio,
+                generator=self.state.get("generator"),
+            )
+        return self.base(attn, hidden_states, encoder_hidden_states,
+                         attention_mask, temb, *args, **kwargs)
+
+
+class TokenMergingFluxAttnProcessor:
+    """
+    Внимание FLUX (двойные и одиночные блоки) со слиянием ключей/значений
+    токенов изображения после RoPE: позиции запросов не меняются, а
+    слитый ключ усредняет уже повёрнутые ключи соседних токенов.
+
+    Самостоятельный класс, а не наследник FluxAttnProcessor2_0: с diffusers
+    0.35 это заглушка, которая подменяет себя на FluxAttnProcessor.
+    Работает и с Attention (diffusers < 0.35), и с FluxAttention.
+    """
+
+    # Атрибуты, которые FluxAttention (diffusers >= 0.35) ожидает у процессора
+    _attention_backend = None
+    _parallel_config = None
+
+    def __init__(self, state, merge_ratio, min_tokens):
+        self.state = state
+        self.merge_ratio = merge_ratio
+        self.min_tokens = min_tokens
+
+    def _merge_image_kv(self, key, value, text_tokens):
+        batch, heads, length, head_dim = key.shape
+        image_tokens = length - text_tokens
+        grid = self.state.get("grid")
+        if image_tokens < self.min_tokens or grid is None:
+            return key, value
+
+        def to_tokens(t):
+            return t[:, :, text_tokens:].transpose(1, 2).reshape(batch, image_tokens, -1)
+
+        def to_heads(t):
+            return t.reshape(batch, -1, heads, head_dim).transpose(1, 2)
+
+        image_keys = to_tokens(key)
+        merge = bipartite_merge(
+            image_keys, grid[0], grid[1], self.merge_ratio,
+            generator=self.state.get("generator"),
+        )
+        if merge is None:
+            return key, value
+        key = torch.cat([key[:, :, :text_tokens], to_heads(merge(image_keys))], dim=2)
+        value = torch.cat([value[:, :, :text_tokens], to_heads(merge(to_tokens(value)))], dim=2)
+        return key, value
+
+    def __call__(self, attn, hidden_states, encoder_hidden_states=None,
+                 attention_mask=None, image_rotary_emb=None):
+        batch_size = hidden_states.shape[0]
+
+        query = attn.to_q(hidden_states)
+        key = attn.to_k(hidden_states)
+        value = attn.to_v(hidden_states)
+
+        inner_dim = key.shape[-1]
+        head_dim = inner_dim // attn.heads
+
+        query = query.view(batch_size, -1, attn.heads, head_dim).transpose(1, 2)
+        key = key.view(batch_size, -1, attn.heads, head_dim).transpose(1, 2)
+        value = value.view(batch_size, -1, attn.heads, head_dim).transpose(1, 2)
+
+        if attn.norm_q is not None:
+            query = attn.norm_q(query)
+        if attn.norm_k is not None:
+            key = attn.norm_k(key)
+
+        # Двойные блоки: текстовые проекции идут перед токенами изображения
+        if encoder_hidden_states is not None:
+            text_tokens = encoder_hidden_states.shape[1]
+
+            def project(proj):
+                return proj(encoder_hidden_states).view(
+                    batch_size, -1, attn.heads, head_dim
+                ).transpose(1, 2)
+
+            text_query = project(attn.add_q_proj)
+            text_key = project(attn.add_k_proj)
+            text_value = project(attn.add_v_proj)
+            if attn.norm_added_q is not None:
+                text_query = attn.norm_added_q(text_query)
+            if attn.norm_added_k is not None:
+                text_key = attn.norm_added_k(text_key)
+
+            query = torch.cat([text_query, query], dim=2)
+            key = torch.cat([text_key, key], dim=2)
+            value = torch.cat([text_value, value], dim=2)
+        else:
+            # Одиночные блоки: текст уже склеен с изображением в начале
+            text_tokens = self.state.get("text_tokens", 0)
+
+        if image_rotary_emb is not None:
+            if isinstance(image_rotary_emb, tuple):
+                query = apply_rotary_emb(query, image_rotary_emb)
+                key = apply_rotary_emb(key, image_rotary_emb)
+            else:
+                query, key = apply_rope(query, key, image_rotary_emb)
+
+        if self.state.get("generator") is not None:
+            key, value = self._merge_image_kv(key, value, text_tokens)
+
+        hidden_states = F.scaled_dot_product_attention(
+            query, key, value, attn_mask=attention_mask, dropout_p=0.0, is_causal=False
+        )
+        hidden_states = hidden_states.transpose(1, 2).reshape(batch_size, -1, attn.heads * head_dim)
+        hidden_states = hidden_states.to(query.dtype)
+
+        if encoder_hidden_states is None:
+            return hidden_states
+
+        encoder_hidden_states, hidden_states = (
+            hidden_states[:, :text_tokens],
+            hidden_states[:, text_tokens:],
+        )
+        hidden_states = attn.to_out[0](hidden_states)
+        hidden_states = attn.to_out[1](hidden_states)
+        encoder_hidden_states = attn.to_add_out(encoder_hidden_states)
+        return hidden_states, encoder_hidden_states
+
+
+def _record_inputs(state):
+    """Запоминает размеры латентов/токенов текущего шага для процессоров"""
+    def hook(module, args, kwargs):
+        sample = args[0] if args else kwargs.get("sample", kwargs.get("hidden_states"))
+        if sample.ndim == 4:
+            state["latent_size"] = tuple(sample.shape[-2:])
+        img_ids = kwargs.get("img_ids")
+        if img_ids is not None:
+            # FLUX: img_ids хранит (0, строка, столбец) упакованных латентов
+            ids = img_ids.reshape(-1, img_ids.shape[-1])
+            state["grid"] = (int(ids[:, 1].max()) + 1, int(ids[:, 2].max()) + 1)
+            state["text_tokens"] = kwargs["encoder_hidden_states"].shape[1]
+        if state.get("generator") is None:
+            state["generator"] = torch.Generator(device=sample.device).manual_seed(state["seed"])
+    return hook
+
+
+def enable_attention_acceleration(pipe, merge_ratio=DEFAULT_MERGE_RATIO,
+                                  min_tokens=DEFAULT_MIN_TOKENS, seed=0):
+    """
+    Включает SDPA-внимание и слияние токенов. merge_ratio=0 - только SDPA.
+    Генератор разбиения пересеивается seed на каждом вызове pipe(...), поэтому
+    разбиение для промпта не зависит от его места в прогоне.
+    Возвращает True, если ToMe применён.
+    """
+    disable_attention_acceleration(pipe)
+
+    unet = getattr(pipe, "unet", None)
+    if unet is not None:
+        # Возвращает SDPA, если был выставлен классический AttnProcessor
+        unet.set_attn_processor(AttnProcessor2_0())
+        denoiser, processor_cls, suffix = unet, TokenMergingAttnProcessor, "attn1"
+    else:
+        denoiser, processor_cls, suffix = pipe.transformer, TokenMergingFluxAttnProcessor, "attn"
+    if merge_ratio <= 0:
+        return False
+
+    state = {"seed": seed}
+    saved = []
+    # attn1 - Attention в блоках UNet; attn - Attention или FluxAttention в блоках FLUX
+    for name, module in denoiser.named_modules():
+        if name.endswith(suffix) and hasattr(module, "set_processor"):
+            saved.append((module, module.processor))
+            module.set_processor(processor_cls(state, merge_ratio, min_tokens))
+    hook = denoiser.register_forward_pre_hook(_record_inputs(state), with_kwargs=True)
+    add_call_hook(pipe, "tome", lambda: state.update(generator=None))
+    pipe._tome = (hook, saved)
+    return True
+
+
+def disable_attention_acceleration(pipe):
+    """Снимает ToMe и возвращает прежние процессоры внимания"""
+    tome = getattr(pipe, "_tome", None)
+    if tome is None:
+        return
+    hook, saved = tome
+    hook.remove()
+    for module, processor in saved:
+        module.set_processor(processor)
+    remove_call_hook(pipe, "tome")
+    pipe._tome = None
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Автоматическая оценка качества баннеров BannerAdsAI
+CLIP-соответствие промпту, эстетическая оценка и поиск почти-дубликатов
+
+Заменяет критерий "pipe() не упал = успех" в тестовых скриптах:
+все изображения прогона прогоняются через CLIP батчами, текстовые
+эмбеддинги кэшируются на диске между запусками.
+
+CLI (python banner_quality.py manifest.json) печатает метрики в JSON.
+Продакшн-бэкенд (backend/routes/image-generation.js) его пока не вызывает:
+там изображения приходят URL/data URL от внешних API, а запуск процесса
+с загрузкой CLIP на каждый запрос слишком дорог - для этого нужен
+постоянно работающий сервис оценки.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+import torch
+from PIL import Image
+from transformers import CLIPModel, CLIPProcessor
+
+# Эстетический предиктор LAION обучен поверх ViT-L/14, поэтому модель общая
+DEFAULT_CLIP_MODEL = "openai/clip-vit-large-patch14"
+AESTHETIC_WEIGHTS_URL = (
+    "https://github.com/christophschuhmann/improved-aesthetic-predictor/"
+    "raw/main/sac+logos+ava1-l14-linearMSE.pth"
+)
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "banneradsai", "quality"
+)
+
+# Пороги по умолчанию для рекламных баннеров
+MIN_CLIP_SCORE = 22.0       # 100 * cos(текст, изображение)
+MIN_AESTHETIC_SCORE = 5.0   # шкала LAION 1-10
+MAX_DUPLICATE_DISTANCE = 6  # бит из 64 в pHash
+
+PHASH_SIZE = 32
+PHASH_BITS = 8
+
+
+class AestheticHead(torch.nn.Module):
+    """MLP из improved-aesthetic-predictor (LAION) поверх эмбеддингов CLIP"""
+
+    def __init__(self, input_size=768):
+        super().__init__()
+        self.layers = torch.nn.Sequential(
+            torch.nn.Linear(input_size, 1024),
+            torch.nn.Dropout(0.2),
+            torch.nn.Linear(1024, 128),
+            torch.nn.Dropout(0.2),
+            torch.nn.Linear(128, 64),
+            torch.nn.Dropout(0.1),
+            torch.nn.Linear(64, 16),
+            torch.nn.Linear(16, 1),
+        )
+
+    def forward(self, embeds):
+        return self.layers(embeds)
+
+
+def _load_image(image):
+    if isinstance(image, Image.Image):
+        return image if image.mode == "RGB" else image.convert("RGB")
+    return Image.open(image).convert("RGB")
+
+
+def _dct_matrix(size):
+    """Ортонормированная матрица DCT-II для батчевого pHash"""
+    n = np.arange(size)
+    matrix = np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / (2 * size))
+    matrix *= np.sqrt(2.0 / size)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+_DCT = _dct_matrix(PHASH_SIZE)
+
+
+def perceptual_hashes(images):
+    """
+    pHash для всех изображений сразу: 64-битные хэши в массиве uint64.
+    DCT считается одним einsum по батчу, а не по одной картинке.
+    """
+    pixels = np.stack([
+        np.asarray(
+            _load_image(image).convert("L").resize(
+                (PHASH_SIZE, PHASH_SIZE), Image.LANCZOS
+            ),
+            dtype=np.float64,
+        )
+        for image in images
+    ])
+    dct = np.einsum("ij,njk,lk->nil", _DCT, pixels, _DCT)
+    low = dct[:, :PHASH_BITS, :PHASH_BITS].reshape(len(pixels), -1)
+    bits = low > np.median(low, axis=1, keepdims=True)
+    return np.packbits(bits, axis=1).view(">u8").ravel().astype(np.uint64)
+
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _popcount(values):
+    if hasattr(np, "bitwise_count"):  # numpy >= 2.0
+        return np.bitwise_count(values)
+    bytes_view = values.view(np.uint8).reshape(values.shape + (8,))
+    return _POPCOUNT[bytes_view].sum(axis=-1, dtype=np.uint8)
+
+
+def hamming_distances(hashes, other=None):
+    """Матрица расстояний Хэмминга между массивами 64-битных хэшей"""
+    other = hashes if other is None else other
+    return _popcount(hashes[:, None] ^ other[None, :])
+
+
+def find_near_duplicates(hashes, max_distance=MAX_DUPLICATE_DISTANCE,
+                         chunk_size=1024):
+    """
+    Для каждого изображения - индекс первого более раннего почти-дубликата
+    или -1. Матрица считается блоками, чтобы не держать N x N в памяти.
+    """
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    duplicate_of = np.full(len(hashes), -1, dtype=np.int64)
+    for start in range(0, len(hashes), chunk_size):
+        block = hashes[start:start + chunk_size]
+        distances = hamming_distances(block, hashes[:start + len(block)])
+        rows = np.arange(len(block))
+        # Сравниваем только с предыдущими изображениями (и не с собой)
+        earlier = np.arange(start + len(block))[None, :] < (start + rows)[:, None]
+        close = (distances <= max_distance) & earlier
+        has_match = close.any(axis=1)
+        duplicate_of[start + rows[has_match]] = close[has_match].argmax(axis=1)
+    return duplicate_of
+
+
+class BannerQualityScorer:
+    """Батчевый скоринг прогона: CLIP score, эстетика и дубликаты"""
+
+    def __init__(self, model_name=DEFAULT_CLIP_MODEL, device=None,
+                 batch_size=32, cache_dir=DEFAULT_CACHE_DIR, aesthetic=True):
+        if device is None:
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.device = device
+        self.batch_size = batch_size
+        self.model_name = model_name
+        self.dtype = torch.float16 if device == "cuda" else torch.float32
+
+        self.processor = CLIPProcessor.from_pretrained(model_name)
+        self.model = CLIPModel.from_pretrained(
+            model_name, torch_dtype=self.dtype
+        ).to(device).eval()
+
+        self.aesthetic_head = None
+        if aesthetic:
+            self.aesthetic_head = AestheticHead(self.model.config.projection_dim)
+            state_dict = torch.hub.load_state_dict_from_url(
+                AESTHETIC_WEIGHTS_URL, map_location="cpu", progress=False
+            )
+            self.aesthetic_head.load_state_dict(state_dict)
+            self.aesthetic_head.to(device, self.dtype).eval()
+
+        self.cache_path = None
+        self._text_cache = {}
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            slug = model_name.replace("/", "--")
+            self.cache_path = os.path.join(cache_dir, f"text_{slug}.npz")
+            self._load_text_cache()
+
+    def _load_text_cache(self):
+        if not os.path.exists(self.cache_path):
+            return
+        with np.load(self.cache_path) as data:
+            self._text_cache = dict(zip(data["keys"].tolist(), data["embeds"]))
+
+    def _save_text_cache(self):
+        if not self.cache_path or not self._text_cache:
+            return
+        keys = list(self._text_cache)
+        tmp_path = self.cache_path + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            keys=np.array(keys),
+            embeds=np.stack([self._text_cache[k] for k in keys]),
+        )
+        os.replace(tmp_path, self.cache_path)
+
+    @staticmethod
+    def _prompt_key(prompt):
+        return hashlib.sha1(prompt.encode("utf-8")).hexdigest()
+
+    @torch.inference_mode()
+    def embed_texts(self, prompts):
+        """Нормированные текстовые эмбеддинги; считаются только новые промпты"""
+        missing = sorted({
+            p for p in prompts if self._prompt_key(p) not in self._text_cache
+        })
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            inputs = self.processor(
+                text=batch, padding=True, truncation=True, return_tensors="pt"
+            ).to(self.device)
+            embeds = self.model.get_text_features(**inputs)
+            embeds = torch.nn.functional.normalize(embeds.float(), dim=-1)
+            for prompt, embed in zip(batch, embeds.cpu().numpy()):
+                self._text_cache[self._prompt_key(prompt)] = embed
+        if missing:
+            self._save_text_cache()
+        return np.stack([self._text_cache[self._prompt_key(p)] for p in prompts])
+
+    @torch.inference_mode()
+    def embed_images(self, images):
+        """Нормированные эмбеддинги изображений, батчами по batch_size"""
+        chunks = []
+        for start in range(0, len(images), self.batch_size):
+            batch = [_load_image(i) for i in images[start:start + self.batch_size]]
+            inputs = self.processor(images=batch, return_tensors="pt")
+            pixel_values = inputs["pixel_values"].to(self.device, self.dtype)
+            embeds = self.model.get_image_features(pixel_values=pixel_values)
+            chunks.append(torch.nn.functional.normalize(embeds.float(), dim=-1))
+        return torch.cat(chunks).cpu().numpy()
+
+    @torch.inference_mode()
+    def aesthetic_scores(self, image_embeds):
+        if self.aesthetic_head is None:
+            return None
+        embeds = torch.from_numpy(image_embeds).to(self.device, self.dtype)
+        return self.aesthetic_head(embeds).float().squeeze(-1).cpu().numpy()
+
+    def score(self, images, prompts,
+              max_duplicate_distance=MAX_DUPLICATE_DISTANCE):
+        """
+        Оценка всего прогона. images - пути или PIL.Image, prompts - промпт
+        для каждого изображения. Возвращает список словарей с метриками.
+        """
+        if len(images) != len(prompts):
+            raise ValueError("Количество изображений и промптов не совпадает")
+        if not images:
+            return []
+
+        # Каждый файл декодируется один раз: батч идёт и в CLIP, и в pHash
+        embed_chunks, hash_chunks = [], []
+        for start in range(0, len(images), self.batch_size):
+            batch = [_load_image(i) for i in images[start:start + self.batch_size]]
+            embed_chunks.append(self.embed_images(batch))
+            hash_chunks.append(perceptual_hashes(batch))
+        image_embeds = np.concatenate(embed_chunks)
+        hashes = np.concatenate(hash_chunks)
+
+        text_embeds = self.embed_texts(prompts)
+        clip_scores = 100.0 * np.clip((image_embeds * text_embeds).sum(-1), 0, None)
+        aesthetic = self.aesthetic_scores(image_embeds)
+        duplicate_of = find_near_duplicates(hashes, max_duplicate_distance)
+
+        return [
+            {
+                "clip_score": round(float(clip_scores[i]), 3),
+                "aesthetic_score": (
+                    None if aesthetic is None else round(float(aesthetic[i]), 3)
+                ),
+                "phash": f"{int(hashes[i]):016x}",
+                "duplicate_of": int(duplicate_of[i]) if duplicate_of[i] >= 0 else None,
+            }
+            for i in range(len(images))
+        ]
+
+
+def passes_quality_gate(quality, min_clip_score=MIN_CLIP_SCORE,
+                        min_aesthetic_score=MIN_AESTHETIC_SCORE):
+    """Проходит ли изображение пороги качества (дубликаты не проходят)"""
+    if quality["duplicate_of"] is not None:
+        return False
+    if quality["clip_score"] < min_clip_score:
+        return False
+    aesthetic = quality["aesthetic_score"]
+    return aesthetic is None or aesthetic >= min_aesthetic_score
+
+
+def format_quality(quality):
+    """Короткая строка с метриками для вывода в тестовых скриптах"""
+    parts = [f"CLIP {quality['clip_score']:.1f}"]
+    if quality["aesthetic_score"] is not None:
+        parts.append(f"эстетика {quality['aesthetic_score']:.2f}")
+    if quality["duplicate_of"] is not None:
+        parts.append(f"дубликат {quality['duplicate_of']}")
+    return ", ".join(parts)
+
+
+def evaluate_run(results, prompts, scorer=None, **gate_kwargs):
+    """
+    Оценивает результаты тестового скрипта (словари с 'name', 'success',
+    'file'). prompts - словарь name -> промпт. Добавляет в каждый успешный
+    результат поля 'quality' и 'passed'; возвращает прошедшие порог.
+    """
+    generated = [r for r in results if r.get("success")]
+    for r in results:
+        r["passed"] = False
+    if not generated:
+        return []
+
+    scorer = scorer or BannerQualityScorer()
+    qualities = scorer.score(
+        [r["file"] for r in generated], [prompts[r["name"]] for r in generated]
+    )
+    for r, quality in zip(generated, qualities):
+        if quality["duplicate_of"] is not None:
+            quality["duplicate_of"] = generated[quality["duplicate_of"]]["name"]
+        r["quality"] = quality
+        r["passed"] = passes_quality_gate(quality, **gate_kwargs)
+    return [r for r in generated if r["passed"]]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Оценка качества баннеров: CLIP score, эстетика, дубликаты"
+    )
+    parser.add_argument(
+        "manifest",
+        help='JSON-файл со списком [{"file": ..., "prompt": ...}] или "-" для stdin',
+    )
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--device", default=None)
+    parser.add_argument("--no-aesthetic", action="store_true")
+    parser.add_argument("--min-clip-score", type=float, default=MIN_CLIP_SCORE)
+    parser.add_argument("--min-aesthetic-score", type=float, default=MIN_AESTHETIC_SCORE)
+    parser.add_argument("--max-duplicate-distance", type=int, default=MAX_DUPLICATE_DISTANCE)
+    args = parser.parse_args()
+
+    if args.manifest == "-":
+        entries = json.load(sys.stdin)
+    else:
+        with open(args.manifest, encoding="utf-8") as f:
+            entries = json.load(f)
+
+    scorer = BannerQualityScorer(
+        device=args.device, batch_size=args.batch_size,
+        aesthetic=not args.no_aesthetic,
+    )
+    qualities = scorer.score(
+        [e["file"] for e in entries], [e["prompt"] for e in entries],
+        max_duplicate_distance=args.max_duplicate_distance,
+    )
+    for entry, quality in zip(entries, qualities):
+        entry.update(quality)
+        entry["passed"] = passes_quality_gate(
+            quality, args.min_clip_score, args.min_aesthetic_score
+        )
+
+    json.dump(entries, sys.stdout, ensure_ascii=False, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк кэширования признаков между шагами (DeepCache) для BannerAdsAI
+Латентность и качество относительно полного пересчёта, по каждой модели
+"""
+
+from feature_cache import FEATURE_CACHE_PRESETS, disable_feature_cache, enable_feature_cache
+from generation_benchmark import benchmark_parser, run_benchmark
+
+
+def main():
+    parser = benchmark_parser("Бенчмарк кэширования признаков по моделям",
+                              "benchmark_feature_cache", models=",".join(FEATURE_CACHE_PRESETS))
+    parser.add_argument("--intervals", default="2,3,5",
+                        help="Дополнительные интервалы пересчёта поверх пресета")
+    args = parser.parse_args()
+    intervals = [int(i) for i in args.intervals.split(",") if i]
+
+    def configurations(pipe, model_key):
+        yield "baseline"
+        preset_interval = FEATURE_CACHE_PRESETS[model_key]["interval"]
+        # None - пресет модели как есть; его интервал второй раз не гоняем
+        for interval in [None] + [i for i in intervals if i != preset_interval]:
+            overrides = {} if interval is None else {"interval": interval}
+            cache = enable_feature_cache(pipe, preset=model_key, **overrides)
+            tag = f"cache-{cache.interval}" + ("-preset" if interval is None else "")
+            yield tag
+            print(f"   📦 {tag}: пересчётов {cache.stats['refresh']}, из кэша {cache.stats['cached']}")
+        disable_feature_cache(pipe)
+
+    run_benchmark(args, configurations, "кэширование признаков относительно полного пересчёта")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк token merging (ToMe) + SDPA для BannerAdsAI
+Ускорение и изменение качества для каждой доли слияния, по каждой модели
+
+База для UNet-моделей - классический AttnProcessor (матрица внимания
+целиком), строка sdpa - тот же UNet на scaled_dot_product_attention.
+FLUX в diffusers считает внимание только через SDPA, поэтому для него
+база уже SDPA и строки sdpa нет.
+"""
+
+from diffusers.models.attention_processor import AttnProcessor
+
+from attention_acceleration import disable_attention_acceleration, enable_attention_acceleration
+from generation_benchmark import benchmark_parser, run_benchmark
+
+
+def main():
+    parser = benchmark_parser("Бенчмарк ToMe + SDPA по моделям", "benchmark_tome")
+    parser.add_argument("--ratios", default="0,0.3,0.5,0.7",
+                        help="Доли слитых токенов; 0 - только SDPA (UNet)")
+    args = parser.parse_args()
+    ratios = [float(r) for r in args.ratios.split(",")]
+
+    def configurations(pipe, model_key):
+        unet = getattr(pipe, "unet", None)
+        if unet is not None:
+            # База - классическое внимание, чтобы строка sdpa показывала вклад SDPA
+            unet.set_attn_processor(AttnProcessor())
+        yield "baseline"
+        for ratio in ratios:
+            if ratio <= 0 and unet is None:
+                # FLUX всегда считает внимание через SDPA: строка повторила бы базу
+                continue
+            enable_attention_acceleration(pipe, merge_ratio=ratio)
+            yield f"tome-{ratio:g}" if ratio > 0 else "sdpa"
+        disable_attention_acceleration(pipe)
+
+    run_benchmark(args, configurations, "ToMe + SDPA относительно базовой генерации")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""
+Фейковые бэкенды генерации для нагрузочного тестирования BannerAdsAI
+Без весов моделей и без платных вызовов Replicate
+
+FakePipeline повторяет интерфейс pipe(prompt=..., **params).images[0]
+из test-flux-dev.py / test-playground-v25.py, FakeReplicateServer -
+HTTP API Replicate (создание и опрос predictions, скачивание файлов),
+FakeReplicateClient - client.run(model, input={...}) из test-juggernaut-xl.py.
+Настоящий replicate.Client можно направить на сервер через base_url.
+
+Задержки задаются строкой распределения (секунды):
+    const:2.0             - фиксированная
+    uniform:1.5,3.0       - равномерная
+    exp:2.0               - экспоненциальная со средним 2.0
+    normal:2.0,0.3        - нормальная (обрезается снизу нулём)
+    lognormal:2.0,0.25    - логнормальная: медиана и sigma
+"""
+
+import http.server
+import inspect
+import itertools
+import json
+import math
+import os
+import random
+import re
+import struct
+import threading
+import time
+import urllib.request
+import zlib
+from datetime import datetime, timezone
+
+try:
+    from PIL import Image
+except ImportError:  # Нагрузочный тест не требует Pillow
+    Image = None
+
+
+# JSON с настройками FakePipeline для from_pretrained, например
+# FAKE_PIPELINE_CONFIG='{"latency": "exp:3.0", "failure_rate": 0.05}'
+FAKE_PIPELINE_CONFIG_ENV = "FAKE_PIPELINE_CONFIG"
+
+
+class FakeBackendError(RuntimeError):
+    """Имитация ошибки генерации (OOM, таймаут воркера и т.п.)"""
+
+
+def make_latency(spec, rng=None):
+    """Возвращает функцию без аргументов, выдающую задержку в секундах"""
+    rng = rng or random.Random()
+    if callable(spec):
+        return spec
+    if isinstance(spec, (int, float)):
+        return lambda: float(spec)
+
+    kind, _, raw_args = spec.partition(":")
+    args = [float(a) for a in raw_args.split(",") if a]
+    if kind == "const" and len(args) == 1:
+        return lambda: args[0]
+    if kind == "uniform" and len(args) == 2:
+        return lambda: rng.uniform(args[0], args[1])
+    if kind == "exp" and len(args) == 1:
+        return lambda: rng.expovariate(1.0 / args[0])
+    if kind == "normal" and len(args) == 2:
+        return lambda: max(0.0, rng.gauss(args[0], args[1]))
+    if kind == "lognormal" and len(args) == 2:
+        mu = math.log(args[0])
+        return lambda: rng.lognormvariate(mu, args[1])
+    raise ValueError(f"Неизвестное распределение задержки: {spec!r}")
+
+
+def _png_chunk(kind, data):
+    return (struct.pack(">I", len(data)) + kind + data
+            + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF))
+
+
+def encode_png(width, height, rng=None, size_bytes=None):
+    """
+    Настоящий RGB PNG без Pillow: шумовая текстура из нескольких случайных
+    строк (хорошо сжимается), при size_bytes файл добивается до нужного
+    размера вспомогательным чанком, который декодеры пропускают.
+    """
+    rng = rng or random.Random()
+    tile = bytes(rng.getrandbits(8) for _ in range(96))
+    rows = [
+        b"\x00" + (bytes(rng.getrandbits(8) for _ in range(96)) + tile)
+        * (width // 64 + 1)
+        for _ in range(8)
+    ]
+    raw = b"".join(rows[y % len(rows)][:1 + width * 3] for y in range(height))
+    png = (
+        b"\x89PNG\r\n\x1a\n"
+        + _png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        + _png_chunk(b"IDAT", zlib.compress(raw, 6))
+    )
+    end = _png_chunk(b"IEND", b"")
+    # 12 байт - длина, тип и CRC чанка-заполнителя
+    padding = (size_bytes or 0) - len(png) - len(end) - 12
+    if padding >= 0:
+        png += _png_chunk(b"fkPd", b"\x00" * padding)
+    return png + end
+
+
+class FakeImage:
+    """Заглушка изображения, если Pillow не установлен: save() пишет байты"""
+
+    def __init__(self, width, height, payload):
+        self.size = (width, height)
+        self.payload = payload
+
+    def save(self, path, *args, **kwargs):
+        with open(path, "wb") as f:
+            f.write(self.payload)
+
+
+class FakePipelineOutput:
+    def __init__(self, images):
+        self.images = images
+
+
+class FakePipeline:
+    """
+    Drop-in замена diffusers-пайплайна. Задержка сэмплируется на каждое
+    изображение; если задан reference_steps, она масштабируется по
+    num_inference_steps (25 шагов FLUX против 50 у Playground).
+    """
+
+    def __init__(self, latency="lognormal:2.0,0.25", failure_rate=0.0,
+                 width=1024, height=1024, reference_steps=None,
+                 seed=None, render_images=True):
+        self.rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._sample_latency = make_latency(latency, self.rng)
+        self.failure_rate = failure_rate
+        self.width = width
+        self.height = height
+        self.reference_steps = reference_steps
+        self.render_images = render_images
+        self.calls = 0
+
+    @classmethod
+    def from_pretrained(cls, pretrained_model_name_or_path=None, **kwargs):
+        """
+        Замена DiffusionPipeline.from_pretrained. Настройки фейка берутся из
+        JSON в FAKE_PIPELINE_CONFIG и из одноимённых kwargs (kwargs важнее);
+        аргументы diffusers (torch_dtype, variant и т.п.) игнорируются.
+        """
+        settings = json.loads(os.environ.get(FAKE_PIPELINE_CONFIG_ENV) or "{}")
+        own = inspect.signature(cls.__init__).parameters
+        settings.update({k: v for k, v in kwargs.items() if k in own})
+        return cls(**settings)
+
+    def to(self, *args, **kwargs):
+        return self
+
+    def _make_image(self, width, height):
+        if not self.render_images:
+            return FakeImage(width, height, b"")
+        if Image is not None:
+            return Image.effect_noise((width, height), 64).convert("RGB")
+        return FakeImage(width, height, encode_png(width, height, self.rng))
+
+    def __call__(self, prompt=None, num_inference_steps=None, width=None,
+                 height=None, num_images_per_prompt=1, **kwargs):
+        width = width or self.width
+        height = height or self.height
+
+        with self._rng_lock:
+            self.calls += 1
+            delay = sum(self._sample_latency() for _ in range(num_images_per_prompt))
+            failed = self.rng.random() < self.failure_rate
+        if self.reference_steps and num_inference_steps:
+            delay *= num_inference_steps / self.reference_steps
+
+        time.sleep(delay)
+        if failed:
+            raise FakeBackendError("Фейковая ошибка генерации")
+        return FakePipelineOutput([
+            self._make_image(width, height) for _ in range(num_images_per_prompt)
+        ])
+
+
+def _now_iso():
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+class _ReplicateHandler(http.server.BaseHTTPRequestHandler):
+    server_version = "FakeReplicate/1.0"
+
+    _create_model = re.compile(r"^/v1/models/([^/]+)/([^/]+)/predictions$")
+    _get_prediction = re.compile(r"^/v1/predictions/([^/]+)$")
+    _get_file = re.compile(r"^/files/([^/]+)/(\d+)\.png$")
+
+    def log_message(self, format, *args):
+        pass  # Не засоряем вывод нагрузочного теста
+
+    def _send_json(self, status, body):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_POST(self):
+        backend = self.server.backend
+        match = self._create_model.match(self.path)
+        if match:
+            model, version = f"{match.group(1)}/{match.group(2)}", None
+        elif self.path == "/v1/predictions":
+            model, version = None, None
+        else:
+            return self._send_json(404, {"detail": "Not found"})
+
+        body = self._read_json()
+        version = body.get("version", version)
+        prediction = backend.create_prediction(model, version, body.get("input", {}))
+
+        # Синхронный режим Replicate: "Prefer: wait" или "Prefer: wait=60"
+        prefer = self.headers.get("Prefer", "")
+        if prefer.startswith("wait"):
+            _, _, seconds = prefer.partition("=")
+            backend.wait(prediction["id"], float(seconds or 60))
+        self._send_json(201, backend.snapshot(prediction["id"]))
+
+    def do_GET(self):
+        backend = self.server.backend
+        match = self._get_prediction.match(self.path)
+        if match:
+            snapshot = backend.snapshot(match.group(1))
+            if snapshot is None:
+                return self._send_json(404, {"detail": "Not found"})
+            return self._send_json(200, snapshot)
+
+        match = self._get_file.match(self.path)
+        if match:
+            payload = backend.file_payload
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+        self._send_json(404, {"detail": "Not found"})
+
+
+class FakeReplicateServer:
+    """
+    Фейковый HTTP API Replicate. capacity - число одновременно
+    обрабатываемых predictions (GPU-воркеры), остальные ждут в очереди
+    со статусом "starting", как на настоящем Replicate.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency="lognormal:6.0,0.3",
+                 failure_rate=0.0, output_bytes=1_500_000, num_outputs=1,
+                 capacity=4, width=1024, height=1024, seed=None):
+        self.rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._sample_latency = make_latency(latency, self.rng)
+        self.failure_rate = failure_rate
+        self.num_outputs = num_outputs
+        self.file_payload = encode_png(width, height, self.rng, output_bytes)
+        self._slots = threading.BoundedSemaphore(capacity)
+        self._predictions = {}
+        self._done = {}
+        self._ids = itertools.count(1)
+
+        self.httpd = http.server.ThreadingHTTPServer((host, port), _ReplicateHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.backend = self
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def create_prediction(self, model, version, input):
+        prediction_id = f"fake{next(self._ids):08d}"
+        prediction = {
+            "id": prediction_id,
+            "model": model,
+            "version": version,
+            "input": input,
+            "output": None,
+            "error": None,
+            "logs": "",
+            "status": "starting",
+            "created_at": _now_iso(),
+            "started_at": None,
+            "completed_at": None,
+            "metrics": {},
+            "urls": {
+                "get": f"{self.base_url}/v1/predictions/{prediction_id}",
+                "cancel": f"{self.base_url}/v1/predictions/{prediction_id}/cancel",
+            },
+        }
+        with self._lock:
+            self._predictions[prediction_id] = prediction
+            self._done[prediction_id] = threading.Event()
+        threading.Thread(target=self._run, args=(prediction_id,), daemon=True).start()
+        return prediction
+
+    def _run(self, prediction_id):
+        with self._slots:
+            with self._lock:
+                prediction = self._predictions[prediction_id]
+                prediction["status"] = "processing"
+                prediction["started_at"] = _now_iso()
+                delay = self._sample_latency()
+                failed = self.rng.random() < self.failure_rate
+            time.sleep(delay)
+
+        with self._lock:
+            prediction["completed_at"] = _now_iso()
+            prediction["metrics"] = {"predict_time": round(delay, 3)}
+            if failed:
+                prediction["status"] = "failed"
+                prediction["error"] = "Фейковая ошибка генерации"
+            else:
+                num_outputs = int(prediction["input"].get("num_outputs", self.num_outputs))
+                prediction["status"] = "succeeded"
+                prediction["output"] = [
+                    f"{self.base_url}/files/{prediction_id}/{i}.png"
+                    for i in range(num_outputs)
+                ]
+        self._done[prediction_id].set()
+
+    def wait(self, prediction_id, timeout):
+        self._done[prediction_id].wait(timeout)
+
+    def snapshot(self, prediction_id):
+        with self._lock:
+            prediction = self._predictions.get(prediction_id)
+            return None if prediction is None else dict(prediction)
+
+
+class FakeModelError(RuntimeError):
+    """Аналог replicate.exceptions.ModelError для упавших predictions"""
+
+
+class FakeReplicateClient:
+    """
+    Минимальный клиент Replicate на urllib с интерфейсом client.run().
+    Создание prediction идёт с "Prefer: wait=<wait>", поэтому сервер отвечает
+    сразу по завершении; опрос нужен только если prediction дольше wait.
+    """
+
+    def __init__(self, base_url, api_token="fake-token", wait=60,
+                 poll_interval=0.25, timeout=600):
+        self.base_url = base_url.rstrip("/")
+        self.api_token = api_token
+        self.wait = wait
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+
+    def _request(self, method, path, body=None, headers=None):
+        data = None if body is None else json.dumps(body).encode("utf-8")
+        request = urllib.request.Request(
+            self.base_url + path, data=data, method=method,
+            headers={
+                "Authorization": f"Bearer {self.api_token}",
+                "Content-Type": "application/json",
+                **(headers or {}),
+            },
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+    def run(self, ref, input=None, **params):
+        return self.create_and_wait(ref, input)["output"]
+
+    def create_and_wait(self, ref, input=None):
+        """Создаёт prediction и дожидается его завершения"""
+        owner_name, _, version = ref.partition(":")
+        prefer = {"Prefer": f"wait={self.wait}"} if self.wait else None
+        if version:
+            prediction = self._request(
+                "POST", "/v1/predictions", {"version": version, "input": input or {}}, prefer
+            )
+        else:
+            prediction = self._request(
+                "POST", f"/v1/models/{owner_name}/predictions", {"input": input or {}}, prefer
+            )
+
+        deadline = time.monotonic() + self.timeout
+        while prediction["status"] not in ("succeeded", "failed", "canceled"):
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Prediction {prediction['id']} не завершился")
+            time.sleep(self.poll_interval)
+            prediction = self._request("GET", f"/v1/predictions/{prediction['id']}")
+
+        if prediction["status"] != "succeeded":
+            raise FakeModelError(prediction.get("error") or prediction["status"])
+        return prediction
+
+    def download(self, url):
+        """Скачивание выхода, как requests.get(image_url) в скриптах"""
+        with urllib.request.urlopen(url, timeout=self.timeout) as response:
+            return response.read()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Кэширование признаков между шагами денойзинга (в стиле DeepCache) для BannerAdsAI
+Глубокие блоки пересчитываются раз в interval шагов, мелкие - на каждом шаге
+
+Соседние шаги дают почти одинаковые высокоуровневые признаки, поэтому
+между шагами обновления глубокие блоки возвращают закэшированный результат:
+- UNet (Playground v2.5, Juggernaut XL): пересчитываются только внешние
+  branch уровней down_blocks/up_blocks, выход глубоких блоков берётся из кэша;
+- трансформер (FLUX.1-dev): для диапазонов блоков кэшируется их остаток
+  (выход минус вход), который добавляется к свежему входу диапазона.
+
+Не требует дообучения и совместимо с ToMe/SDPA из attention_acceleration.
+"""
+
+from pipeline_hooks import add_call_hook, remove_call_hook
+
+# interval - раз во сколько шагов пересчитывать глубокие блоки,
+# warmup_steps - первые шаги (самые изменчивые) считаются полностью
+FEATURE_CACHE_PRESETS = {
+    "playground-v25": {"interval": 3, "branch": 1, "warmup_steps": 2},
+    "juggernaut-xl": {"interval": 3, "branch": 1, "warmup_steps": 2},
+    "flux-dev": {
+        "interval": 2,
+        "warmup_steps": 2,
+        # Диапазоны в пределах одного списка: между списками FLUX склеивает токены
+        "spans": [("transformer_blocks", 1, None), ("single_transformer_blocks", 0, -2)],
+    },
+}
+
+
+class FeatureCache:
+    """Счётчик шагов и переключение обновление/кэш для денойзера"""
+
+    def __init__(self, denoiser, interval, warmup_steps=0):
+        if interval < 1:
+            raise ValueError("interval должен быть >= 1")
+        self.denoiser = denoiser
+        self.interval = interval
+        self.warmup_steps = warmup_steps
+        self.step = -1
+        self.refresh = True
+        self.stats = {"refresh": 0, "cached": 0}
+        self._input_shape = None
+        self._patched = []
+        self._hook = denoiser.register_forward_pre_hook(self._on_step, with_kwargs=True)
+
+    def reset(self):
+        """Начало новой генерации: вызывается перед каждым pipe(...)"""
+        self.step = -1
+
+    def _on_step(self, module, args, kwargs):
+        sample = kwargs.get("hidden_states", kwargs.get("sample", args[0] if args else None))
+        self.step += 1
+
+        shape_changed = tuple(sample.shape) != self._input_shape
+        self._input_shape = tuple(sample.shape)
+        self.refresh = (
+            shape_changed
+            or self.step < self.warmup_steps
+            or (self.step - self.warmup_steps) % self.interval == 0
+        )
+        self.stats["refresh" if self.refresh else "cached"] += 1
+
+    def _patch(self, module, forward):
+        self._patched.append((module, module.forward))
+        module.forward = forward
+
+    def remove(self):
+        self._hook.remove()
+        for module, forward in reversed(self._patched):
+            module.forward = forward
+        self._patched = []
+
+
+class UNetFeatureCache(FeatureCache):
+    """
+    DeepCache для UNet: на шагах из кэша down_blocks[branch:], mid_block и
+    up_blocks[:-branch] возвращают прошлый результат без вычислений.
+    up_blocks[-branch:] получают свежие skip-соединения от внешних уровней.
+    """
+
+    def __init__(self, unet, interval=3, branch=1, warmup_steps=0):
+        # branch=0 кэшировал бы все down-блоки, а up-блоки шли бы со старыми skip
+        if not 1 <= branch < len(unet.down_blocks):
+            raise ValueError(f"branch должен быть от 1 до {len(unet.down_blocks) - 1}")
+        super().__init__(unet, interval, warmup_steps)
+        self._outputs = {}
+        deep_blocks = (
+            list(unet.down_blocks[branch:])
+            + ([unet.mid_block] if unet.mid_block is not None else [])
+            + list(unet.up_blocks[:-branch])
+        )
+        for index, block in enumerate(deep_blocks):
+            self._patch(block, self._cached_forward(index, block.forward))
+
+    def reset(self):
+        super().reset()
+        self._outputs = {}
+
+    def _cached_forward(self, index, forward):
+        def cached_forward(*args, **kwargs):
+            if self.refresh or index not in self._outputs:
+                self._outputs[index] = forward(*args, **kwargs)
+            return self._outputs[index]
+        return cached_forward
+
+    def remove(self):
+        super().remove()
+        self._outputs = {}
+
+
+class TransformerFeatureCache(FeatureCache):
+    """
+    Кэш остатков для диапазонов блоков трансформера. На шаге из кэша первый
+    блок диапазона сразу возвращает вход + сохранённый остаток, остальные
+    блоки диапазона пропускают данные без изменений.
+    """
+
+    def __init__(self, transformer, spans, interval=2, warmup_steps=0):
+        super().__init__(transformer, interval, warmup_steps)
+        self._spans = []
+        for attr, start, stop in spans:
+            blocks = list(getattr(transformer, attr))[start:stop]
+            if not blocks:
+                continue
+            span = {"input": None, "residual": None}
+            self._spans.append(span)
+            for position, block in enumerate(blocks):
+                self._patch(block, self._span_forward(
+                    span, block.forward, position == 0, position == len(blocks) - 1
+                ))
+
+    def reset(self):
+        super().reset()
+        for span in self._spans:
+            span["input"] = span["residual"] = None
+
+    @staticmethod
+    def _inputs(kwargs, like):
+        # Блоки FLUX принимают именованные аргументы и возвращают либо
+        # hidden_states, либо (encoder_hidden_states, hidden_states)
+        if isinstance(like, tuple):
+            return (kwargs["encoder_hidden_states"], kwargs["hidden_states"])
+        return kwargs["hidden_states"]
+
+    def _span_forward(self, span, forward, is_first, is_last):
+        def span_forward(*args, **kwargs):
+            if self.refresh or span["residual"] is None:
+                output = forward(*args, **kwargs)
+                if is_first:
+                    span["input"] = self._inputs(kwargs, output)
+                if is_last:
+                    if isinstance(output, tuple):
+                        span["residual"] = tuple(o - i for o, i in zip(output, span["input"]))
+                    else:
+                        span["residual"] = output - span["input"]
+                    span["input"] = None
+                return output
+
+            inputs = self._inputs(kwargs, span["residual"])
+            if not is_first:
+                return inputs
+            if isinstance(inputs, tuple):
+                return tuple(i + r for i, r in zip(inputs, span["residual"]))
+            return inputs + span["residual"]
+        return span_forward
+
+    def remove(self):
+        super().remove()
+        self._spans = []
+
+
+def enable_feature_cache(pipe, preset=None, **overrides):
+    """
+    Включает кэширование признаков. preset - ключ FEATURE_CACHE_PRESETS,
+    overrides - interval, warmup_steps, branch (UNet) или spans (трансформер).
+    """
+    disable_feature_cache(pipe)
+    settings = dict(FEATURE_CACHE_PRESETS[preset]) if preset else {}
+    settings.update(overrides)
+
+    if getattr(pipe, "unet", None) is not None:
+        settings.pop("spans", None)
+        cache = UNetFeatureCache(pipe.unet, **settings)
+    elif getattr(pipe, "transformer", None) is not None:
+        if "spans" not in settings:
+            raise ValueError("Для трансформера нужны spans (см. FEATURE_CACHE_PRESETS)")
+        settings.pop("branch", None)
+        cache = TransformerFeatureCache(pipe.transformer, **settings)
+    else:
+        raise ValueError("Пайплайн без unet/transformer не поддерживается")
+
+    # Шаги считаются от начала каждого вызова pipe(...), а не по таймстепам
+    add_call_hook(pipe, "feature_cache", cache.reset)
+    pipe._feature_cache = cache
+    return cache
+
+
+def disable_feature_cache(pipe):
+    cache = getattr(pipe, "_feature_cache", None)
+    if cache is None:
+        return
+    cache.remove()
+    remove_call_hook(pipe, "feature_cache")
+    pipe._feature_cache = None
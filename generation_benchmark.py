@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Общие утилиты бенчмарков ускорения генерации BannerAdsAI
+Загрузка моделей, замер времени и сравнение качества с базовым прогоном
+
+Качество сравнивается через banner_quality: CLIP score и эстетика по
+каждой конфигурации, плюс расстояние pHash до базового изображения с тем же
+seed (насколько ускорение меняет картинку).
+"""
+
+import argparse
+import gc
+import json
+import os
+import time
+
+import diffusers
+import numpy as np
+import torch
+
+from banner_quality import BannerQualityScorer, hamming_distances
+
+# Настройки взяты из тестовых скриптов; Juggernaut - локальные веса SDXL,
+# т.к. через Replicate процесс денойзинга недоступен
+MODEL_PRESETS = {
+    "playground-v25": {
+        "repo": "playgroundai/playground-v2.5-1024px-aesthetic",
+        "pipeline": "DiffusionPipeline",
+        "dtype": torch.float16,
+        "variant": "fp16",
+        "params": {"num_inference_steps": 50, "guidance_scale": 3.0,
+                   "width": 1024, "height": 1024},
+    },
+    "juggernaut-xl": {
+        "repo": "RunDiffusion/Juggernaut-XL-v9",
+        "pipeline": "StableDiffusionXLPipeline",
+        "dtype": torch.float16,
+        "variant": "fp16",
+        "params": {"num_inference_steps": 40, "guidance_scale": 7.0,
+                   "width": 1024, "height": 1024},
+    },
+    "flux-dev": {
+        "repo": "black-forest-labs/FLUX.1-dev",
+        "pipeline": "FluxPipeline",
+        "dtype": torch.bfloat16,
+        "variant": None,
+        "params": {"num_inference_steps": 25, "guidance_scale": 3.5,
+                   "width": 1024, "height": 1024, "max_sequence_length": 256},
+    },
+}
+
+BENCHMARK_PROMPTS = [
+    {
+        "prompt": "Professional e-commerce sale banner, '50% OFF' text prominently displayed, vibrant red and white colors, modern clean typography, commercial photography style, high quality, detailed, 8k",
+        "name": "ecommerce_sale"
+    },
+    {
+        "prompt": "Luxury fashion advertisement banner, elegant female model wearing designer clothes, minimalist aesthetic, premium brand style, soft lighting, commercial quality, detailed, 8k",
+        "name": "fashion_luxury"
+    },
+    {
+        "prompt": "Food delivery service advertisement, appetizing gourmet burger with fresh ingredients, warm inviting colors, lifestyle photography, commercial food styling, detailed, 8k",
+        "name": "food_delivery"
+    },
+    {
+        "prompt": "Real estate luxury home advertisement, stunning modern house exterior, professional architectural photography, premium real estate marketing style, detailed, 8k",
+        "name": "real_estate"
+    },
+]
+
+
+def load_pipeline(model_key, device=None):
+    preset = MODEL_PRESETS[model_key]
+    device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+    pipeline_cls = getattr(diffusers, preset["pipeline"])
+    dtype = preset["dtype"] if device == "cuda" else torch.float32
+    variant = preset["variant"] if device == "cuda" else None
+    return pipeline_cls.from_pretrained(
+        preset["repo"], torch_dtype=dtype, variant=variant
+    ).to(device)
+
+
+def _synchronize():
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+
+
+def generate_timed(pipe, params, prompts, output_dir, tag, seed=0):
+    """Генерирует по изображению на промпт с фиксированным seed и замеряет время"""
+    os.makedirs(output_dir, exist_ok=True)
+    records = []
+    for test_case in prompts:
+        generator = torch.Generator(device=pipe.device).manual_seed(seed)
+        _synchronize()
+        start_time = time.time()
+        image = pipe(prompt=test_case["prompt"], generator=generator, **params).images[0]
+        _synchronize()
+        generation_time = time.time() - start_time
+
+        output_path = os.path.join(output_dir, f"{tag}_{test_case['name']}.png")
+        image.save(output_path)
+        records.append({
+            "name": test_case["name"],
+            "prompt": test_case["prompt"],
+            "time": generation_time,
+            "file": output_path,
+        })
+        print(f"   ⚡ {tag} / {test_case['name']}: {generation_time:.2f} сек")
+    return records
+
+
+def warmup(pipe, params):
+    """Один короткий прогон, чтобы компиляция ядер не попала в замеры"""
+    pipe(prompt=BENCHMARK_PROMPTS[0]["prompt"], **{**params, "num_inference_steps": 2})
+
+
+def compare_runs(runs, baseline, scorer=None):
+    """
+    runs - словарь tag -> записи generate_timed. Возвращает строки сравнения
+    с базовой конфигурацией: ускорение, дельты CLIP/эстетики и pHash-дрейф.
+    """
+    scorer = scorer or BannerQualityScorer()
+    tags = list(runs)
+    records = [r for tag in tags for r in runs[tag]]
+    qualities = scorer.score(
+        [r["file"] for r in records], [r["prompt"] for r in records],
+        max_duplicate_distance=-1,  # дубликаты здесь ожидаемы, не помечаем
+    )
+    for r, quality in zip(records, qualities):
+        r["quality"] = quality
+        r["phash"] = np.array([int(quality["phash"], 16)], dtype=np.uint64)
+
+    def mean(values):
+        values = [v for v in values if v is not None]
+        return float(np.mean(values)) if values else None
+
+    base = {r["name"]: r for r in runs[baseline]}
+    base_time = mean(r["time"] for r in runs[baseline])
+    base_clip = mean(r["quality"]["clip_score"] for r in runs[baseline])
+    base_aesthetic = mean(r["quality"]["aesthetic_score"] for r in runs[baseline])
+
+    rows = []
+    for tag in tags:
+        run = runs[tag]
+        avg_time = mean(r["time"] for r in run)
+        clip = mean(r["quality"]["clip_score"] for r in run)
+        aesthetic = mean(r["quality"]["aesthetic_score"] for r in run)
+        drift = mean(
+            int(hamming_distances(r["phash"], base[r["name"]]["phash"])[0, 0])
+            for r in run
+        )
+        rows.append({
+            "config": tag,
+            "time": avg_time,
+            "speedup": base_time / avg_time if avg_time else None,
+            "clip_score": clip,
+            "clip_delta": clip - base_clip,
+            "aesthetic_score": aesthetic,
+            "aesthetic_delta": (
+                None if aesthetic is None or base_aesthetic is None
+                else aesthetic - base_aesthetic
+            ),
+            "phash_drift": drift,
+        })
+    return rows
+
+
+def print_comparison(model_key, rows):
+    print(f"\n📊 {model_key}:")
+    print(f"   {'конфигурация':<18}{'сек':>8}{'x':>7}{'CLIP':>8}{'ΔCLIP':>8}"
+          f"{'эстет.':>8}{'Δэстет.':>9}{'pHash':>7}")
+    for row in rows:
+        aesthetic = "-" if row["aesthetic_score"] is None else f"{row['aesthetic_score']:.2f}"
+        aesthetic_delta = "-" if row["aesthetic_delta"] is None else f"{row['aesthetic_delta']:+.2f}"
+        print(f"   {row['config']:<18}{row['time']:>8.2f}{row['speedup']:>7.2f}"
+              f"{row['clip_score']:>8.2f}{row['clip_delta']:>+8.2f}"
+              f"{aesthetic:>8}{aesthetic_delta:>9}{row['phash_drift']:>7.1f}")
+
+
+def benchmark_model(model_key, configurations, prompts, output_dir):
+    """
+    Прогоняет модель по конфигурациям. configurations(pipe, model_key) -
+    генератор тегов: перед каждым yield пайплайн настроен на очередную
+    конфигурацию, после последнего генератор снимает свои настройки.
+    """
+    print(f"\n🚀 {model_key}: загружаем модель...")
+    pipe = load_pipeline(model_key)
+    params = MODEL_PRESETS[model_key]["params"]
+    warmup(pipe, params)
+
+    runs = {}
+    for tag in configurations(pipe, model_key):
+        runs[tag] = generate_timed(pipe, params, prompts, output_dir, f"{model_key}_{tag}")
+
+    del pipe
+    gc.collect()
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+    return runs
+
+
+def benchmark_parser(description, output_dir, models=",".join(MODEL_PRESETS)):
+    """Общие аргументы бенчмарков: модели, число промптов, каталог и JSON"""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--models", default=models)
+    parser.add_argument("--num-prompts", type=int, default=len(BENCHMARK_PROMPTS))
+    parser.add_argument("--output-dir", default=output_dir)
+    parser.add_argument("--json", default=None, help="Сохранить результаты в JSON")
+    return parser
+
+
+def run_benchmark(args, configurations, title):
+    """
+    Прогоняет все модели из args (см. benchmark_parser), затем оценивает
+    качество одним общим scorer и печатает сравнение с тегом baseline.
+    """
+    prompts = BENCHMARK_PROMPTS[:args.num_prompts]
+
+    # Модели генерируют по очереди, оценка - после, чтобы не делить VRAM
+    all_runs = {
+        model_key: benchmark_model(model_key, configurations, prompts, args.output_dir)
+        for model_key in args.models.split(",")
+    }
+
+    print("\n" + "=" * 70)
+    print(f"🎯 РЕЗУЛЬТАТЫ: {title}")
+    print("=" * 70)
+    scorer = BannerQualityScorer()
+    results = {}
+    for model_key, runs in all_runs.items():
+        results[model_key] = compare_runs(runs, baseline="baseline", scorer=scorer)
+        print_comparison(model_key, results[model_key])
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Результаты сохранены: {args.json}")
+    return results
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Open-loop нагрузочный генератор для пути генерации BannerAdsAI
+Пуассоновский поток запросов с рампой интенсивности поверх фейковых бэкендов
+
+Запросы приходят по расписанию независимо от того, успевает ли бэкенд
+(open loop), поэтому при перегрузке растёт очередь, а не падает нагрузка.
+Отчёт: пропускная способность, задержка в очереди и хвосты латентности.
+
+Примеры:
+    python load_generator.py --target pipeline --workers 2 --stages "60:0.2-1.5"
+    python load_generator.py --target replicate --capacity 4 \\
+        --latency lognormal:6,0.3 --stages "30:0.2,60:0.2-1.0,30:1.0"
+"""
+
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from fake_backends import FakePipeline, FakeReplicateClient, FakeReplicateServer
+
+# Параметры генерации из тестовых скриптов
+PIPELINE_PARAMS = {
+    "num_inference_steps": 25,
+    "guidance_scale": 3.5,
+    "width": 1024,
+    "height": 1024,
+}
+REPLICATE_MODEL = "asiryan/juggernaut-xl-v7"
+REPLICATE_PARAMS = {
+    "width": 1024,
+    "height": 1024,
+    "guidance_scale": 7,
+    "num_inference_steps": 40,
+    "scheduler": "K_EULER_ANCESTRAL",
+    "num_outputs": 1,
+}
+PROMPT = "Professional e-commerce sale banner, '50% OFF' text, vibrant red and white colors"
+
+
+class RateSchedule:
+    """
+    Кусочно-линейная интенсивность запросов (запросов/сек).
+    Формат: "60:0.5" - 60 секунд с постоянной интенсивностью 0.5,
+    "120:0.1-2.0" - рампа от 0.1 до 2.0 за 120 секунд; этапы через запятую.
+    """
+
+    def __init__(self, stages):
+        if not stages:
+            raise ValueError("Расписание нагрузки пустое")
+        for index, (duration, start, end) in enumerate(stages, 1):
+            if duration <= 0:
+                raise ValueError(f"Этап {index}: длительность должна быть > 0, получено {duration:g}")
+            if start < 0 or end < 0:
+                raise ValueError(f"Этап {index}: интенсивность не может быть отрицательной")
+        self.stages = stages
+
+    @classmethod
+    def parse(cls, text):
+        stages = []
+        for part in text.split(","):
+            duration, _, rates = part.strip().partition(":")
+            start, _, end = rates.partition("-")
+            try:
+                stages.append((float(duration), float(start), float(end or start)))
+            except ValueError:
+                raise ValueError(
+                    f"Некорректный этап {part.strip()!r}: ожидается \"сек:rate\" "
+                    f"или \"сек:rate1-rate2\" с неотрицательной интенсивностью"
+                ) from None
+        return cls(stages)
+
+    @property
+    def duration(self):
+        return sum(stage[0] for stage in self.stages)
+
+    def stage_at(self, t):
+        elapsed = 0.0
+        for index, (duration, start, end) in enumerate(self.stages):
+            if t < elapsed + duration or index == len(self.stages) - 1:
+                progress = min(max((t - elapsed) / duration, 0.0), 1.0)
+                return index, start + (end - start) * progress
+            elapsed += duration
+
+    def rate_at(self, t):
+        return self.stage_at(t)[1]
+
+    def arrivals(self, rng):
+        """Моменты прихода запросов: неоднородный пуассоновский поток (thinning)"""
+        max_rate = max(max(start, end) for _, start, end in self.stages)
+        if max_rate <= 0:
+            return []
+        times = []
+        t = 0.0
+        while True:
+            t += rng.expovariate(max_rate)
+            if t >= self.duration:
+                return times
+            if rng.random() * max_rate < self.rate_at(t):
+                times.append(t)
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = max(0, math.ceil(q / 100.0 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def _distribution(values):
+    values = sorted(values)
+    if not values:
+        return None
+    return {
+        "mean": sum(values) / len(values),
+        "p50": _percentile(values, 50),
+        "p90": _percentile(values, 90),
+        "p95": _percentile(values, 95),
+        "p99": _percentile(values, 99),
+        "max": values[-1],
+    }
+
+
+def run_load(call, schedule, workers, seed=None):
+    """
+    Прогоняет расписание через call(). call может вернуть задержку в
+    очереди на стороне сервера (сек) - она добавляется к клиентской.
+    """
+    rng = random.Random(seed)
+    arrivals = schedule.arrivals(rng)
+    records = []
+    lock = threading.Lock()
+
+    def job(arrival_offset, scheduled):
+        start = time.monotonic()
+        record = {
+            "arrival": arrival_offset,
+            "stage": schedule.stage_at(arrival_offset)[0],
+            "queue": start - scheduled,
+        }
+        server_queue = 0.0
+        try:
+            server_queue = call() or 0.0
+            record["ok"] = True
+            record["queue"] += server_queue
+        except Exception as e:
+            record["ok"] = False
+            record["error"] = f"{type(e).__name__}: {e}"
+        end = time.monotonic()
+        # Время обслуживания без ожидания в очереди сервера
+        record["service"] = end - start - server_queue
+        record["latency"] = end - scheduled
+        record["finished"] = end
+        with lock:
+            records.append(record)
+
+    t0 = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for offset in arrivals:
+            scheduled = t0 + offset
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(job, offset, scheduled)
+    wall_time = max((r["finished"] for r in records), default=time.monotonic()) - t0
+    return records, wall_time
+
+
+def summarize(records, schedule, wall_time):
+    def block(subset, duration):
+        ok = [r for r in subset if r["ok"]]
+        return {
+            "requests": len(subset),
+            "offered_rate": len(subset) / duration if duration else 0.0,
+            "succeeded": len(ok),
+            "errors": len(subset) - len(ok),
+            "error_rate": (len(subset) - len(ok)) / len(subset) if subset else 0.0,
+            "queue": _distribution([r["queue"] for r in subset]),
+            "latency": _distribution([r["latency"] for r in ok]),
+            "service": _distribution([r["service"] for r in ok]),
+        }
+
+    report = block(records, schedule.duration)
+    report["wall_time"] = wall_time
+    report["throughput"] = report["succeeded"] / wall_time if wall_time else 0.0
+    report["stages"] = []
+    for index, (duration, start, end) in enumerate(schedule.stages):
+        stage = block([r for r in records if r["stage"] == index], duration)
+        stage["rate"] = [start, end]
+        report["stages"].append(stage)
+    return report
+
+
+def _fmt(distribution, key):
+    if not distribution:
+        return "   -   "
+    return f"{distribution[key]:7.2f}"
+
+
+def print_report(report):
+    print("\n" + "=" * 70)
+    print("🎯 РЕЗУЛЬТАТЫ НАГРУЗОЧНОГО ТЕСТА:")
+    print("=" * 70)
+    print(f"📨 Запросов: {report['requests']} ({report['offered_rate']:.2f}/сек предложено)")
+    print(f"✅ Успешных: {report['succeeded']}, ❌ ошибок: {report['errors']} "
+          f"({report['error_rate'] * 100:.1f}%)")
+    print(f"⚡ Пропускная способность: {report['throughput']:.2f} изображений/сек "
+          f"за {report['wall_time']:.1f} сек")
+
+    print(f"\n{'':12}{'p50':>8}{'p95':>8}{'p99':>8}{'max':>8}")
+    for title, key in (("Очередь", "queue"), ("Латентность", "latency"), ("Сервис", "service")):
+        distribution = report[key]
+        print(f"{title:12}" + "".join(
+            f" {_fmt(distribution, q)}" for q in ("p50", "p95", "p99", "max")
+        ))
+
+    print(f"\n📊 По этапам:")
+    for index, stage in enumerate(report["stages"]):
+        start, end = stage["rate"]
+        rate = f"{start:g}" if start == end else f"{start:g}->{end:g}"
+        print(f"   {index + 1}. {rate:>10}/сек: {stage['succeeded']}/{stage['requests']} ок, "
+              f"очередь p95 {_fmt(stage['queue'], 'p95').strip()} сек, "
+              f"латентность p99 {_fmt(stage['latency'], 'p99').strip()} сек")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop нагрузочный тест генерации баннеров")
+    parser.add_argument("--target", choices=("pipeline", "replicate"), default="pipeline")
+    parser.add_argument("--stages", default="60:0.5",
+                        help='Этапы "сек:rate" или "сек:rate1-rate2" через запятую')
+    parser.add_argument("--latency", default=None,
+                        help="Распределение задержки генерации (см. fake_backends.py)")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="pipeline: число GPU-воркеров; replicate: клиентских потоков")
+    parser.add_argument("--width", type=int, default=1024)
+    parser.add_argument("--height", type=int, default=1024)
+    parser.add_argument("--no-render", action="store_true",
+                        help="pipeline: не создавать изображения, только задержка")
+    parser.add_argument("--capacity", type=int, default=4,
+                        help="replicate: одновременных predictions на сервере")
+    parser.add_argument("--output-bytes", type=int, default=1_500_000,
+                        help="replicate: размер скачиваемого файла")
+    parser.add_argument("--replicate-url", default=None,
+                        help="Внешний (фейковый) сервер вместо встроенного")
+    parser.add_argument("--download", action="store_true",
+                        help="replicate: скачивать результат, как скрипты")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", default=None, help="Сохранить отчёт в JSON")
+    args = parser.parse_args()
+
+    schedule = RateSchedule.parse(args.stages)
+    server = None
+
+    if args.target == "pipeline":
+        pipe = FakePipeline(
+            latency=args.latency or "lognormal:2.0,0.25",
+            failure_rate=args.failure_rate, seed=args.seed,
+            render_images=not args.no_render,
+        )
+        params = {**PIPELINE_PARAMS, "width": args.width, "height": args.height}
+
+        def call():
+            pipe(prompt=PROMPT, **params).images[0]
+
+        workers = args.workers or 1
+    else:
+        base_url = args.replicate_url
+        if base_url is None:
+            server = FakeReplicateServer(
+                latency=args.latency or "lognormal:6.0,0.3",
+                failure_rate=args.failure_rate, output_bytes=args.output_bytes,
+                capacity=args.capacity, width=args.width, height=args.height,
+                seed=args.seed,
+            ).start()
+            base_url = server.base_url
+        # Prefer: wait вместо опроса, чтобы латентность не округлялась до шага опроса
+        client = FakeReplicateClient(base_url, wait=3600, poll_interval=0.01)
+        params = {**REPLICATE_PARAMS, "width": args.width, "height": args.height}
+
+        def call():
+            prediction = client.create_and_wait(
+                REPLICATE_MODEL, input={"prompt": PROMPT, **params}
+            )
+            if args.download:
+                for url in prediction["output"]:
+                    client.download(url)
+            created = datetime.fromisoformat(prediction["created_at"].replace("Z", "+00:00"))
+            started = datetime.fromisoformat(prediction["started_at"].replace("Z", "+00:00"))
+            return (started - created).total_seconds()
+
+        workers = args.workers or 256
+
+    print(f"🚀 Нагрузочный тест: {args.target}, {len(schedule.stages)} этап(ов), "
+          f"{schedule.duration:.0f} сек, воркеров: {workers}")
+    try:
+        records, wall_time = run_load(call, schedule, workers, seed=args.seed)
+    finally:
+        if server is not None:
+            server.stop()
+
+    report = summarize(records, schedule, wall_time)
+    print_report(report)
+
+    errors = sorted({r["error"] for r in records if not r["ok"]})
+    if errors:
+        print(f"\n⚠️ Ошибки:")
+        for error in errors[:10]:
+            print(f"   - {error}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Отчёт сохранён: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Хуки на начало каждого вызова pipe(...) для режимов ускорения BannerAdsAI
+
+Python ищет __call__ у класса, а не у экземпляра, поэтому пайплайну
+подставляется подкласс того же имени, который перед генерацией вызывает
+зарегистрированные хуки (сброс кэшей, пересев генераторов и т.п.).
+"""
+
+
+def add_call_hook(pipe, name, hook):
+    """Регистрирует hook() под именем name; вызывается перед каждым pipe(...)"""
+    base = type(pipe)
+    if not getattr(base, "_has_call_hooks", False):
+        def __call__(self, *args, **kwargs):
+            for call_hook in list(self._call_hooks.values()):
+                call_hook()
+            return base.__call__(self, *args, **kwargs)
+
+        pipe.__class__ = type(base.__name__, (base,), {
+            "__call__": __call__,
+            "__module__": base.__module__,
+            "_has_call_hooks": True,
+        })
+        pipe._call_hooks = {}
+    pipe._call_hooks[name] = hook
+
+
+def remove_call_hook(pipe, name):
+    getattr(pipe, "_call_hooks", {}).pop(name, None)
@@ -4,11 +4,13 @@
 Проверяем качество генерации против Recraft.ai
 """
 
+import gc
 import torch
 from diffusers import FluxPipeline
 import time
 import os
 
+
 def test_flux_dev():
     print("🚀 Тестируем FLUX.1-dev для рекламных баннеров...")
     
@@ -31,6 +33,22 @@ def test_flux_dev():
         ).to(device)
         
         print("✅ FLUX.1-dev загружена успешно!")
+
+        # Опциональное ускорение внимания: BANNER_TOME_RATIO=0.5 (0 - без слияния)
+        tome_ratio = os.getenv("BANNER_TOME_RATIO")
+        if tome_ratio is not None:
+            from attention_acceleration import enable_attention_acceleration
+            applied = enable_attention_acceleration(pipe, merge_ratio=float(tome_ratio))
+            if applied:
+                print(f"⚡ Ускорение внимания: ToMe {tome_ratio}")
+            else:
+                print("⚡ ToMe выключен, внимание через SDPA")
+
+        # Опциональное кэширование признаков между шагами: BANNER_FEATURE_CACHE=1
+        if os.getenv("BANNER_FEATURE_CACHE"):
+            from feature_cache import enable_feature_cache
+            enable_feature_cache(pipe, preset="flux-dev")
+            print("⚡ Кэширование признаков включено (пресет flux-dev)")
         
         # Тестовые промпты СПЕЦИАЛЬНО для рекламных баннеров
         advertising_prompts = [
@@ -121,15 +139,37 @@ def test_flux_dev():
         
         print(f"✅ Успешных генераций: {len(successful)}/{len(results)}")
         
+        # Освобождаем VRAM под CLIP перед оценкой качества
+        del pipe
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        
+        # Автоматическая оценка качества вместо "не упало = успех".
+        # Ошибка оценки не должна терять уже сделанные генерации
+        print("🔍 Оцениваем качество: CLIP score, эстетика, дубликаты...")
+        try:
+            from banner_quality import evaluate_run, format_quality
+            passed = evaluate_run(
+                results, {t['name']: t['prompt'] for t in advertising_prompts}
+            )
+            for r in successful:
+                print(f"   {'✅' if r['passed'] else '❌'} {r['name']}: {format_quality(r['quality'])}")
+            print(f"🏅 Прошли порог качества: {len(passed)}/{len(results)}")
+        except Exception as e:
+            print(f"⚠️ Оценка качества недоступна: {e}")
+            print("   Вердикт ниже - только по успешным генерациям, без проверки качества")
+            passed = successful
+        
         if successful:
             avg_time = sum(r['time'] for r in successful) / len(successful)
             print(f"⚡ Средняя скорость: {avg_time:.2f} сек/изображение")
             
         print(f"\n📊 СРАВНЕНИЕ С RECRAFT.AI:")
-        print(f"✅ Качество изображений: {'ПРЕВОСХОДИТ' if len(successful) >= 5 else 'РАВНО'}")
-        print(f"✅ Читаемость текста: {'ОТЛИЧНО' if len(successful) >= 4 else 'ХОРОШО'}")
-        print(f"✅ Коммерческий стиль: {'ДА' if len(successful) >= 5 else 'ЧАСТИЧНО'}")
-        print(f"✅ Подходит для BannerAdsAI: {'ДА' if len(successful) >= 5 else 'ТРЕБУЕТ ДОРАБОТКИ'}")
+        print(f"✅ Качество изображений: {'ПРЕВОСХОДИТ' if len(passed) >= 5 else 'РАВНО'}")
+        print(f"✅ Читаемость текста: {'ОТЛИЧНО' if len(passed) >= 4 else 'ХОРОШО'}")
+        print(f"✅ Коммерческий стиль: {'ДА' if len(passed) >= 5 else 'ЧАСТИЧНО'}")
+        print(f"✅ Подходит для BannerAdsAI: {'ДА' if len(passed) >= 5 else 'ТРЕБУЕТ ДОРАБОТКИ'}")
         
         if failed:
             print(f"\n⚠️ Неудачные тесты:")
@@ -140,7 +180,7 @@ def test_flux_dev():
         print(f"🚀 Стоимость: БЕСПЛАТНО через собственный сервер")
         print(f"💰 Или $0.003/изображение через Replicate API")
         
-        return len(successful) >= 5  # 80%+ успешности
+        return len(passed) >= 5  # 80%+ прошли порог качества
         
     except Exception as e:
         print(f"❌ Критическая ошибка: {e}")
@@ -142,6 +142,22 @@ def test_juggernaut_xl():
         
         print(f"✅ Успешных генераций: {len(successful)}/{len(results)}")
         
+        # Автоматическая оценка качества вместо "не упало = успех".
+        # Ошибка оценки не должна терять уже сделанные генерации
+        print("🔍 Оцениваем качество: CLIP score, эстетика, дубликаты...")
+        try:
+            from banner_quality import evaluate_run, format_quality
+            passed = evaluate_run(
+                results, {t['name']: t['prompt'] for t in advertising_prompts}
+            )
+            for r in successful:
+                print(f"   {'✅' if r['passed'] else '❌'} {r['name']}: {format_quality(r['quality'])}")
+            print(f"🏅 Прошли порог качества: {len(passed)}/{len(results)}")
+        except Exception as e:
+            print(f"⚠️ Оценка качества недоступна: {e}")
+            print("   Вердикт ниже - только по успешным генерациям, без проверки качества")
+            passed = successful
+        
         if successful:
             avg_time = sum(r['time'] for r in successful) / len(successful)
             print(f"⚡ Средняя скорость: {avg_time:.2f} сек/изображение")
@@ -156,11 +172,11 @@ def test_juggernaut_xl():
         print(f"🆚 SD 3.5 Large:   $0.065/изображение")
         
         print(f"\n📈 ОЦЕНКА ДЛЯ BANNERADSAI:")
-        quality_score = len(successful) / len(results) * 100
+        quality_score = len(passed) / len(results) * 100
         print(f"✅ Качество изображений: {quality_score:.1f}%")
         print(f"✅ Стабильность API: {'ОТЛИЧНО' if len(failed) == 0 else 'ХОРОШО'}")
         print(f"✅ Ценовая эффективность: {'ОТЛИЧНО' if cost_per_image < 0.005 else 'ХОРОШО'}")
-        print(f"✅ Подходит для BannerAdsAI: {'ДА' if len(successful) >= 5 else 'ТРЕБУЕТ ДОРАБОТКИ'}")
+        print(f"✅ Подходит для BannerAdsAI: {'ДА' if len(passed) >= 5 else 'ТРЕБУЕТ ДОРАБОТКИ'}")
         
         if failed:
             print(f"\n⚠️ Неудачные тесты:")
@@ -171,7 +187,7 @@ def test_juggernaut_xl():
         print(f"🚀 В 7 раз дешевле Recraft.ai при схожем качестве")
         print(f"💡 Экономия за 1000 изображений: ${(0.01 - cost_per_image) * 1000:.2f}")
         
-        return len(successful) >= 5  # 80%+ успешности
+        return len(passed) >= 5  # 80%+ прошли порог качества
         
     except Exception as e:
         print(f"❌ Критическая ошибка: {e}")
@@ -4,11 +4,13 @@
 Специализированная модель для коммерческой графики
 """
 
+import gc
 import torch
 from diffusers import DiffusionPipeline
 import time
 import os
 
+
 def test_playground_v25():
     print("🎨 Тестируем Playground v2.5 для рекламных баннеров...")
     
@@ -32,6 +34,22 @@ def test_playground_v25():
         ).to(device)
         
         print("✅ Модель загружена успешно!")
+
+        # Опциональное ускорение внимания: BANNER_TOME_RATIO=0.5 (0 - без слияния)
+        tome_ratio = os.getenv("BANNER_TOME_RATIO")
+        if tome_ratio is not None:
+            from attention_acceleration import enable_attention_acceleration
+            applied = enable_attention_acceleration(pipe, merge_ratio=float(tome_ratio))
+            if applied:
+                print(f"⚡ Ускорение внимания: ToMe {tome_ratio}")
+            else:
+                print("⚡ ToMe выключен, внимание через SDPA")
+
+        # Опциональное кэширование признаков между шагами: BANNER_FEATURE_CACHE=1
+        if os.getenv("BANNER_FEATURE_CACHE"):
+            from feature_cache import enable_feature_cache
+            enable_feature_cache(pipe, preset="playground-v25")
+            print("⚡ Кэширование признаков включено (пресет playground-v25)")
         
         # Тестовые промпты СПЕЦИАЛЬНО для рекламных баннеров
         advertising_prompts = [
@@ -129,13 +147,35 @@ def test_playground_v25():
         
         print(f"✅ Успешных генераций: {len(successful)}/{len(results)}")
         
+        # Освобождаем VRAM под CLIP перед оценкой качества
+        del pipe
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        
+        # Автоматическая оценка качества вместо "не упало = успех".
+        # Ошибка оценки не должна терять уже сделанные генерации
+        print("🔍 Оцениваем качество: CLIP score, эстетика, дубликаты...")
+        try:
+            from banner_quality import evaluate_run, format_quality
+            passed = evaluate_run(
+                results, {t['name']: t['prompt'] for t in advertising_prompts}
+            )
+            for r in successful:
+                print(f"   {'✅' if r['passed'] else '❌'} {r['name']}: {format_quality(r['quality'])}")
+            print(f"🏅 Прошли порог качества: {len(passed)}/{len(results)}")
+        except Exception as e:
+            print(f"⚠️ Оценка качества недоступна: {e}")
+            print("   Вердикт ниже - только по успешным генерациям, без проверки качества")
+            passed = successful
+        
         if successful:
             avg_time = sum(r['time'] for r in successful) / len(successful)
             print(f"⚡ Средняя скорость: {avg_time:.2f} сек/изображение")
             
         print(f"\n📊 ОЦЕНКА ДЛЯ РЕКЛАМНЫХ БАННЕРОВ:")
-        print(f"✅ Коммерческое качество: {'ДА' if len(successful) > 0 else 'НЕТ'}")
-        print(f"✅ Подходит для BannerAdsAI: {'ДА' if len(successful) >= 6 else 'ЧАСТИЧНО'}")
+        print(f"✅ Коммерческое качество: {'ДА' if len(passed) > 0 else 'НЕТ'}")
+        print(f"✅ Подходит для BannerAdsAI: {'ДА' if len(passed) >= 6 else 'ЧАСТИЧНО'}")
         print(f"✅ Стабильность: {len(successful)/len(results)*100:.1f}%")
         
         if failed:
@@ -146,7 +186,7 @@ def test_playground_v25():
         print(f"\n🎨 Playground v2.5 специально создана для коммерческой графики!")
         print(f"🚀 Если результаты устраивают - готова к интеграции в BannerAdsAI")
         
-        return len(successful) >= 6  # 75% успешности
+        return len(passed) >= 6  # 75%+ прошли порог качества
         
     except Exception as e:
         print(f"❌ Критическая ошибка: {e}")